@@ -29,6 +29,12 @@ import re
 import warnings
 import copy
 
+# NumPy is optional, it speeds up scaling long data series
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # Helper variables and functions
 # -----------------------------------------------------------------------------
 
@@ -124,45 +130,110 @@ class Data(object):
             warnings.warn('One or more of of your data points has been '
                 'clipped because it is out of range.')
 
+    # Whether scaled values are rounded to integers
+    rounded = True
+
+    @classmethod
+    def scale_values(cls, values, range):
+        """Scale and clip a whole data series at once. The result is the
+        same as calling scale_value() on each value, but much faster on
+        long series.
+        """
+        if all(value is None for value in values):
+            # nothing to scale, and the data may have no range at all
+            return list(values)
+        lower, upper = range
+        assert(upper > lower)
+        factor = float(cls.max_value) / (upper - lower)
+        max_value = cls.max_value
+        if numpy is not None and len(values) and None not in values:
+            scaled = (numpy.asarray(values, dtype=numpy.float64) - lower) * factor
+            if cls.rounded:
+                # round half away from zero, like round() does
+                magnitude = numpy.abs(scaled)
+                rounded = numpy.floor(magnitude)
+                rounded += (magnitude - rounded) >= 0.5
+                scaled = numpy.copysign(rounded, scaled)
+            clipped = numpy.clip(scaled, 0, max_value)
+            Data.check_clip((clipped != scaled).any(), False)
+            if cls.rounded:
+                clipped = clipped.astype(int)
+            return clipped.tolist()
+
+        scaled_values = []
+        append = scaled_values.append
+        clipped = False
+        for value in values:
+            if value is None:
+                append(None)
+                continue
+            scaled = (value - lower) * factor
+            if cls.rounded:
+                scaled = int(round(scaled))
+            if scaled < 0:
+                scaled = 0
+                clipped = True
+            elif scaled > max_value:
+                scaled = max_value
+                clipped = True
+            append(scaled)
+        Data.check_clip(clipped, False)
+        return scaled_values
+
+    @classmethod
+    def in_range(cls, data):
+        """True if every value in the series can be encoded"""
+        return None not in data and \
+            min(data) >= 0 and max(data) <= cls.max_value
+
+    def __repr__(self):
+        return self.prefix + self.separator.join(
+            [self.encode_series(data) for data in self.data])
+
 
 class SimpleData(Data):
 
     max_value = 61
     enc_map = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+    prefix = 'chd=s:'
+    separator = ','
 
-    def __repr__(self):
-        encoded_data = []
-        for data in self.data:
-            sub_data = []
-            for value in data:
-                if value is None:
-                    sub_data.append('_')
-                elif value >= 0 and value <= self.max_value:
-                    sub_data.append(SimpleData.enc_map[value])
-                else:
-                    raise DataOutOfRangeException('cannot encode value: %d'
-                                                  % value)
-            encoded_data.append(''.join(sub_data))
-        return 'chd=s:' + ','.join(encoded_data)
+    @classmethod
+    def encode_series(cls, data):
+        if data and cls.in_range(data):
+            return ''.join(map(cls.enc_map.__getitem__, data))
+        sub_data = []
+        for value in data:
+            if value is None:
+                sub_data.append('_')
+            elif value >= 0 and value <= cls.max_value:
+                sub_data.append(SimpleData.enc_map[value])
+            else:
+                raise DataOutOfRangeException('cannot encode value: %d'
+                                              % value)
+        return ''.join(sub_data)
 
 
 class TextData(Data):
 
     max_value = 100
+    rounded = False
+    prefix = 'chd=t:'
+    separator = '|'
 
-    def __repr__(self):
-        encoded_data = []
-        for data in self.data:
-            sub_data = []
-            for value in data:
-                if value is None:
-                    sub_data.append(-1)
-                elif value >= 0 and value <= self.max_value:
-                    sub_data.append("%.1f" % float(value))
-                else:
-                    raise DataOutOfRangeException()
-            encoded_data.append(','.join(sub_data))
-        return 'chd=t:' + '|'.join(encoded_data)
+    @classmethod
+    def encode_series(cls, data):
+        if data and cls.in_range(data):
+            return ('%.1f,' * len(data) % tuple(data))[:-1]
+        sub_data = []
+        for value in data:
+            if value is None:
+                sub_data.append(-1)
+            elif value >= 0 and value <= cls.max_value:
+                sub_data.append("%.1f" % float(value))
+            else:
+                raise DataOutOfRangeException()
+        return ','.join(sub_data)
 
     @classmethod
     def scale_value(cls, value, range):
@@ -179,26 +250,30 @@ class ExtendedData(Data):
     max_value = 4095
     enc_map = \
         'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-.'
+    # The two character encoding of every value, indexed by value
+    enc_pairs = [first + second for first in enc_map for second in enc_map]
+    prefix = 'chd=e:'
+    separator = ','
 
-    def __repr__(self):
-        encoded_data = []
+    @classmethod
+    def encode_series(cls, data):
+        if data and cls.in_range(data):
+            return ''.join(map(cls.enc_pairs.__getitem__, map(int, data)))
+        sub_data = []
         enc_size = len(ExtendedData.enc_map)
-        for data in self.data:
-            sub_data = []
-            for value in data:
-                if value is None:
-                    sub_data.append('__')
-                elif value >= 0 and value <= self.max_value:
-                    first, second = divmod(int(value), enc_size)
-                    sub_data.append('%s%s' % (
-                        ExtendedData.enc_map[first],
-                        ExtendedData.enc_map[second]))
-                else:
-                    raise DataOutOfRangeException( \
-                        'Item #%i "%s" is out of range' % (data.index(value), \
-                        value))
-            encoded_data.append(''.join(sub_data))
-        return 'chd=e:' + ','.join(encoded_data)
+        for value in data:
+            if value is None:
+                sub_data.append('__')
+            elif value >= 0 and value <= cls.max_value:
+                first, second = divmod(int(value), enc_size)
+                sub_data.append('%s%s' % (
+                    ExtendedData.enc_map[first],
+                    ExtendedData.enc_map[second]))
+            else:
+                raise DataOutOfRangeException( \
+                    'Item #%i "%s" is out of range' % (data.index(value), \
+                    value))
+        return ''.join(sub_data)
 
 
 # Axis Classes
@@ -569,14 +644,8 @@ class Chart(object):
                 scale_range = y_range
             elif type == 'marker-size':
                 scale_range = (0, max(dataset))
-            scaled_dataset = []
-            for v in dataset:
-                if v is None:
-                    scaled_dataset.append(None)
-                else:
-                    scaled_dataset.append(
-                        data_class.scale_value(v, scale_range))
-            scaled_data.append(scaled_dataset)
+            scaled_data.append(
+                data_class.scale_values(dataset, scale_range))
         return scaled_data
 
     def add_data(self, data):
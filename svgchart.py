@@ -0,0 +1,169 @@
+"""
+svgchart - draws the charts from pygooglechart locally as SVG
+
+The charts keep the pygooglechart API, but get_url() returns a data: URI
+holding the chart as an SVG image, so nothing is fetched from the chart
+service. Drawn charts are cached by a hash of everything that affects
+how they look, so rendering the same data again is just a lookup.
+"""
+
+import base64
+import hashlib
+from xml.sax.saxutils import escape
+
+#the most charts kept in the cache
+CACHE_SIZE = 64
+
+_cache = {}
+
+class Axis(object):
+    BOTTOM = 'x'
+    TOP = 't'
+    LEFT = 'y'
+    RIGHT = 'r'
+    TYPES = (BOTTOM, TOP, LEFT, RIGHT)
+
+class Chart(object):
+    """Abstract class for all chart types"""
+
+    FONT_SIZE = 11
+    #the approximate width of a character at FONT_SIZE
+    CHAR_WIDTH = 6
+    COLOURS = ['4D89F9']
+
+    def __init__(self, width, height, colours=None):
+        self.width = width
+        self.height = height
+        self.data = []
+        self.labels = {}
+        self.ranges = {}
+        self.set_colours(colours)
+
+    def set_colours(self, colours):
+        self.colours = colours or self.COLOURS
+
+    def add_data(self, data):
+        self.data.append(list(data))
+        return len(self.data) - 1
+
+    def data_x_range(self):
+        try:
+            return (min([min(d) for d in self.data if d]),
+                    max([max(d) for d in self.data if d]))
+        except ValueError:
+            return None
+
+    def set_axis_labels(self, axis_type, values):
+        assert(axis_type in Axis.TYPES)
+        self.labels[axis_type] = [self._decode(v) for v in values]
+
+    def set_axis_range(self, axis_type, low, high):
+        assert(axis_type in Axis.TYPES)
+        self.ranges[axis_type] = (low, high)
+
+    def _decode(self, s):
+        if isinstance(s, str):
+            return s.decode("utf8", "replace")
+        return unicode(s)
+
+    def _key(self):
+        return hashlib.sha1(repr((
+                    self.__class__.__name__,
+                    sorted(self.__dict__.items())))).hexdigest()
+
+    def _text(self, x, y, text, anchor="start"):
+        return u'<text x="%d" y="%d" text-anchor="%s">%s</text>' % (
+                    x, y, anchor, escape(text))
+
+    def draw(self):
+        raise NotImplementedError
+
+    def get_svg(self):
+        return u''.join((
+                u'<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" '
+                u'font-family="sans-serif" font-size="%d" fill="#333">' % (
+                    self.width, self.height, self.FONT_SIZE),
+                self.draw(),
+                u'</svg>'))
+
+    def get_url(self):
+        key = self._key()
+        try:
+            return _cache[key]
+        except KeyError:
+            pass
+
+        url = "data:image/svg+xml;base64," + base64.b64encode(self.get_svg().encode("utf8"))
+        if len(_cache) >= CACHE_SIZE:
+            _cache.clear()
+        _cache[key] = url
+        return url
+
+class StackedHorizontalBarChart(Chart):
+
+    TICKS = 5
+
+    def __init__(self, *args, **kwargs):
+        Chart.__init__(self, *args, **kwargs)
+        self.bar_width = None
+
+    def set_bar_width(self, bar_width):
+        self.bar_width = bar_width
+
+    def _format_tick(self, v):
+        if v == int(v):
+            return u"%d" % v
+        return u"%.1f" % v
+
+    def draw(self):
+        parts = []
+        rows = max([len(d) for d in self.data] or [0])
+        if not rows:
+            return u''
+
+        #like the chart service, labels on the left axis go from the
+        #bottom up
+        labels = list(reversed(self.labels.get(Axis.LEFT, [])))
+        if labels:
+            x0 = min(self.width / 2, max([len(l) for l in labels]) * self.CHAR_WIDTH + 6)
+        else:
+            x0 = 0
+        bottom = self.FONT_SIZE + 6 if Axis.BOTTOM in self.ranges else 0
+        plotwidth = self.width - x0 - 10
+        slot = float(self.height - bottom) / rows
+        bh = min(self.bar_width or slot, slot - 1)
+
+        #values are scaled over the data range, the same as pygooglechart
+        #does by default
+        low, high = self.data_x_range()
+        scale = float(plotwidth) / (high - low) if high > low else 0
+
+        for i in range(rows):
+            y = i * slot + (slot - bh) / 2
+            x = x0
+            for j, d in enumerate(self.data):
+                try:
+                    w = (d[i] - low) * scale if high > low else plotwidth
+                except IndexError:
+                    continue
+                parts.append(u'<rect x="%.1f" y="%.1f" width="%.1f" height="%.1f" fill="#%s"/>' % (
+                                x, y, w, bh, self.colours[j % len(self.colours)]))
+                x += w
+            if i < len(labels):
+                parts.append(self._text(x0 - 4, y + bh / 2 + self.FONT_SIZE / 3, labels[i], "end"))
+
+        plotheight = self.height - bottom
+        parts.append(u'<path d="M%d 0V%dH%d" stroke="#999" fill="none"/>' % (
+                        x0, plotheight, x0 + plotwidth))
+
+        if Axis.BOTTOM in self.ranges:
+            alow, ahigh = self.ranges[Axis.BOTTOM]
+            for t in range(self.TICKS):
+                v = alow + (ahigh - alow) * float(t) / (self.TICKS - 1)
+                parts.append(self._text(
+                                x0 + plotwidth * t / (self.TICKS - 1),
+                                self.height - 2,
+                                self._format_tick(v),
+                                "middle"))
+
+        return u''.join(parts)
@@ -0,0 +1,535 @@
+#!/usr/bin/env python
+
+# Benchmarks the stages that turn a commits-list archive page into the
+# statistics shown to the user; parsing the page, storing the commits,
+# aggregating them, rendering the summary and filling the project tree.
+#
+# Each stage is run against test/date.html, and against pages generated
+# from it with 10 and 100 times as many commits. The best time of a few
+# runs, the throughput and the peak memory of each stage are reported and
+# compared with a saved baseline; the benchmark fails if any stage got
+# slower by more than the threshold. It also fails if the fast and sgml
+# parsers disagree about date.html, if the http cache does not serve
+# unchanged pages from disk, if any query over the window of days
+# scans a table rather than using an index (see Stats.check_query_plans),
+# or if encoding whole chart series differs from encoding each value.
+#
+#   $ python test/benchmark.py --save      #record a baseline
+#   $ python test/benchmark.py             #compare against it
+
+import sys
+import os
+import os.path
+import re
+import imp
+import types
+import json
+import time
+import datetime
+import tempfile
+import threading
+import resource
+import random
+import warnings
+import cPickle
+import optparse
+import BaseHTTPServer
+
+TESTDIR = os.path.abspath(os.path.dirname(__file__))
+DATADIR = os.path.dirname(TESTDIR)
+
+#the script imports modules that sit next to it
+sys.path.insert(0, DATADIR)
+#keep the http cache and database out of the users cache directory
+os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp(prefix="gdm-benchmark-")
+gdm = imp.load_source("gdm", os.path.join(DATADIR, "gnome-development-monitor"))
+import pygooglechart
+
+ARCHIVE = os.path.join(TESTDIR, "date.html")
+BASELINE = os.path.join(TESTDIR, "benchmark-baseline.json")
+
+#differences in time smaller than this are noise, not regressions
+NOISE = 0.002
+
+RE_DAY = re.compile(r'(<p><strong>)([^<]*)(</strong>.*?</ul>)', re.DOTALL)
+RE_MSGNUM = re.compile(r'<li><a name="(\d+)" href="msg\d+.html">')
+
+def make_archive(scale):
+    """
+    Returns an archive page with scale times as many commits as date.html.
+    Every copy of the original commits is moved back a week, and given
+    new message numbers, so they are all distinct commits
+    """
+    page = open(ARCHIVE).read()
+    if scale == 1:
+        return page
+
+    start = RE_DAY.search(page).start()
+    end = page.rindex("</ul>", 0, page.rindex("</ul>"))
+    days = RE_DAY.findall(page[start:end + len("</ul>")])
+
+    msgnum = [0]
+    def renumber(m):
+        msgnum[0] += 1
+        return '<li><a name="%06d" href="msg%06d.html">' % (msgnum[0], msgnum[0])
+
+    body = []
+    for copy in range(scale):
+        for head, day, rest in days:
+            d = datetime.datetime.strptime(day, "%d %B %Y") - datetime.timedelta(weeks=copy)
+            body.append(head + d.strftime("%d %B %Y") + RE_MSGNUM.sub(renumber, rest) + "\n")
+
+    return page[:start] + "".join(body) + page[end + len("</ul>"):]
+
+def in_worker(stats, func, *args):
+    #the database belongs to the stats worker thread, so run func there
+    #and wait for it to finish
+    done = threading.Event()
+    result = []
+    def job():
+        try:
+            start = time.time()
+            func(*args)
+            result.append((time.time() - start, None))
+        except Exception, e:
+            result.append((0, e))
+        done.set()
+    stats._run_in_worker(job)
+    done.wait()
+    elapsed, error = result[0]
+    if error:
+        raise error
+    return elapsed
+
+def _get_days(data):
+    #a window that covers every commit in the page
+    oldest = min([datetime.datetime.strptime(d, "%d %B %Y") for h, d, r in RE_DAY.findall(data)])
+    return (datetime.datetime.now() - oldest).days + 1
+
+class Benchmark:
+
+    STAGES = ("parse_fast", "parse_sgml", "store", "aggregate", "render", "tree")
+
+    def __init__(self, data):
+        self.data = data
+        self.stats = None
+
+    def _store(self):
+        if not self.stats:
+            self.stats = gdm.Stats(None, _get_days(self.data), gdm.Stats.TRANSLATION_INCLUDE, False)
+        else:
+            self.stats.clear(None, _get_days(self.data), gdm.Stats.TRANSLATION_INCLUDE, False)
+        return in_worker(self.stats, self.stats._parse_data, self.data, "benchmark")
+
+    def _aggregate(self):
+        return in_worker(self.stats, self.stats._generate_stats)
+
+    def setup(self, stage):
+        #run the stages before this one, untimed
+        if stage in ("aggregate", "render", "tree"):
+            self._store()
+        if stage in ("render", "tree"):
+            self._aggregate()
+
+    def run(self, stage):
+        """
+        Runs the stage, returning the time taken and the number of commits
+        it handled
+        """
+        if stage in ("parse_fast", "parse_sgml"):
+            parser = gdm.Stats.PARSERS[stage.split("_")[1]]()
+            start = time.time()
+            parser.parse(self.data)
+            return time.time() - start, len(parser.updates)
+        elif stage == "store":
+            elapsed = self._store()
+        elif stage == "aggregate":
+            elapsed = self._aggregate()
+        elif stage == "render":
+            start = time.time()
+            self.stats.get_summary()
+            elapsed = time.time() - start
+        elif stage == "tree":
+            gdm._import_gui()
+            #an instance without running __init__, which builds the window
+            ui = types.InstanceType(gdm.UI)
+            ui.rows = {}
+            ui.branchrows = {}
+            ui.model = gdm.Gtk.TreeStore(str, int, object, str, bool)
+            ui.stats = self.stats
+            projects = self.stats.get_projects()
+            start = time.time()
+            ui._update_model(projects)
+            ui._update_trends(self.stats.get_trends())
+            elapsed = time.time() - start
+        return elapsed, self.stats.progress[1]
+
+def check_query_plans(scale):
+    """
+    Stores the commits of an archive of the given scale and checks the
+    plans of the queries over the window, returning an error message or
+    None
+    """
+    bench = Benchmark(make_archive(scale))
+    bench._store()
+    try:
+        in_worker(bench.stats, bench.stats.check_query_plans)
+    except AssertionError, e:
+        return str(e)
+    return None
+
+def _parse(parser, data, size):
+    p = parser()
+    for i in range(0, len(data), size):
+        p.feed(data[i:i + size])
+    p.close()
+    return p.updates
+
+def check_parsers(data, commits):
+    """
+    Checks that the fast and sgml parsers find the same commits on the
+    page, whether it is fed to them whole or in pieces, and that there
+    are as many as expected. Returns an error message or None
+    """
+    expected = _parse(gdm.CommitsMailParser, data, len(data))
+    if len(expected) != commits:
+        return "sgml parser found %d commits, expected %d" % (len(expected), commits)
+    #pieces small enough to split every tag, entity and date heading
+    for size in (len(data), 65536, 1000, 7, 1):
+        for parser in (gdm.FastCommitsMailParser, gdm.CommitsMailParser):
+            if parser is gdm.CommitsMailParser and size < 7:
+                #far too slow
+                continue
+            updates = _parse(parser, data, size)
+            if updates != expected:
+                return "%s differs from the sgml parser fed %d bytes at a time, %d commits" % (
+                            parser.__name__, size, len(updates))
+    return None
+
+class _PageHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    #serves server.page with server.etag, and records the If-None-Match
+    #header and response code of each request
+
+    def do_GET(self):
+        server = self.server
+        etag = self.headers.getheader("If-None-Match")
+        if etag == server.etag:
+            server.requests.append((etag, 304))
+            self.send_response(304)
+            self.end_headers()
+            return
+        server.requests.append((etag, 200))
+        self.send_response(200)
+        self.send_header("ETag", server.etag)
+        self.send_header("Content-Length", str(len(server.page) + server.missing))
+        self.end_headers()
+        self.wfile.write(server.page)
+
+    def log_message(self, *args):
+        pass
+
+def check_http_cache(data):
+    """
+    Fetches a page through an HttpCache from a local server, checking that
+    fresh pages come from disk, that stale ones are only downloaded again
+    if their ETag changed, and that a download cut short leaves the cached
+    copy alone. Returns an error message or None
+    """
+    server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), _PageHandler)
+    server.page = data
+    server.etag = '"1"'
+    server.missing = 0
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    cachedir = tempfile.mkdtemp(prefix="gdm-http-cache-")
+    cache = gdm.HttpCache(cachedir)
+    url = "http://127.0.0.1:%d/date.html" % server.server_port
+    def get(ttl, stream=False):
+        if not stream:
+            return cache.get(url, ttl)
+        pieces = []
+        cache.get(url, ttl, stream=pieces.append)
+        return "".join(pieces)
+
+    try:
+        for name, ttl, stream, page, requests in (
+                    ("first download", 0, False, data, [(None, 200)]),
+                    ("fresh page", 3600, False, data, []),
+                    ("unchanged page", 0, False, data, [('"1"', 304)]),
+                    ("unchanged streamed page", 0, True, data, [('"1"', 304)])):
+            del server.requests[:]
+            got = get(ttl, stream)
+            if got != page or server.requests != requests:
+                return "http cache %s: got %d bytes after %s" % (name, len(got), server.requests)
+
+        server.page = data[:len(data) / 2]
+        server.etag = '"2"'
+        for name, stream, requests in (
+                    ("changed page", False, [('"1"', 200)]),
+                    ("streamed page", True, [('"2"', 304)])):
+            del server.requests[:]
+            got = get(0, stream)
+            if got != server.page or server.requests != requests:
+                return "http cache %s: got %d bytes after %s" % (name, len(got), server.requests)
+
+        #the server closes the connection before sending the whole page
+        server.page = data
+        server.etag = '"3"'
+        server.missing = 100
+        try:
+            get(0, True)
+            return "http cache did not notice a page cut short"
+        except IOError:
+            pass
+        if get(None) != data[:len(data) / 2]:
+            return "http cache lost the cached page when a download was cut short"
+        leftover = [f for f in os.listdir(cachedir) if f.endswith(".tmp")]
+        if leftover:
+            return "http cache left temporary files behind: %s" % ", ".join(leftover)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return None
+
+def _encode_by_value(data_class, values, scale_range):
+    #scales and encodes one value at a time, as pygooglechart did before
+    #it handled whole series at once
+    codes = []
+    for value in values:
+        if value is not None:
+            value = data_class.scale_value(value, scale_range)
+        codes.append(data_class.encode_series([value]))
+    if data_class is pygooglechart.TextData:
+        return ",".join(codes)
+    return "".join(codes)
+
+def _encode_series(data_class, values, scale_range):
+    return data_class.encode_series(data_class.scale_values(values, scale_range))
+
+def _make_series(length, kind, gaps):
+    values = []
+    for i in range(length):
+        if gaps and random.random() < 0.1:
+            values.append(None)
+        elif kind == "int":
+            values.append(random.randint(0, 1000))
+        elif kind == "half":
+            values.append(random.randint(0, 2000) / 2.0)
+        else:
+            values.append(random.uniform(-10, 1000))
+    return values
+
+def check_chart_encoding(length):
+    """
+    Checks that scaling and encoding whole chart series gives the same
+    result as doing it one value at a time, with and without NumPy.
+    Returns an error message or None, and the time taken by each way on
+    a series of length values
+    """
+    random.seed(0)
+    data_classes = (pygooglechart.SimpleData, pygooglechart.TextData, pygooglechart.ExtendedData)
+    numpy = pygooglechart.numpy
+    times = {}
+    warnings.simplefilter("ignore")
+    try:
+        for pygooglechart.numpy in set([numpy, None]):
+            for data_class in data_classes:
+                #TextData cannot encode gaps
+                text = data_class is pygooglechart.TextData
+                series = [[], [0], [3, 3]]
+                if not text:
+                    series.extend([[None], [None, None]])
+                for kind in ("int", "half", "float"):
+                    for gaps in (False,) if text else (False, True):
+                        series.extend([_make_series(n, kind, gaps) for n in (1, 2, 10, 1000)])
+                for values in series:
+                    present = [v for v in values if v is not None]
+                    for scale_range in ((0, max(present or [0]) or 1), (-5, 500), None):
+                        if scale_range is None and present:
+                            continue
+                        expected = _encode_by_value(data_class, values, scale_range)
+                        got = _encode_series(data_class, values, scale_range)
+                        if got != expected:
+                            return "%s series differ for %r: %r != %r" % (
+                                        data_class.__name__, values[:10], got[:40], expected[:40]), times
+
+            values = _make_series(length, "int", False)
+            for name, encode in (("by value", _encode_by_value), ("series", _encode_series)):
+                start = time.time()
+                encode(pygooglechart.ExtendedData, values, (0, 1000))
+                times["%s%s" % (name, " (numpy)" if pygooglechart.numpy else "")] = time.time() - start
+    finally:
+        pygooglechart.numpy = numpy
+        warnings.resetwarnings()
+    return None, times
+
+def _rss(field):
+    try:
+        for line in open("/proc/self/status"):
+            if line.startswith(field):
+                return int(line.split()[1]) * 1024
+    except IOError:
+        pass
+    #ru_maxrss is in kB on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _reset_peak():
+    #linux can reset the peak resident size of the process
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except IOError:
+        pass
+
+def in_child(func, *args):
+    """
+    Calls func in a child process, so that the memory it uses does not
+    hide the peak memory of the stages measured after it, and returns
+    its result or raises its error
+    """
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        try:
+            result = func(*args)
+        except Exception, e:
+            result = e
+        os.write(w, cPickle.dumps(result))
+        os._exit(0)
+
+    os.close(w)
+    out = ""
+    while True:
+        s = os.read(r, 4096)
+        if not s:
+            break
+        out += s
+    os.close(r)
+    os.waitpid(pid, 0)
+    result = cPickle.loads(out)
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+def _measure(data, stage, repeat):
+    best = None
+    peak = 0
+    for i in range(repeat):
+        bench = Benchmark(data)
+        bench.setup(stage)
+        _reset_peak()
+        start = _rss("VmRSS")
+        elapsed, commits = bench.run(stage)
+        peak = max(peak, _rss("VmHWM") - start)
+        best = min(best, elapsed) if best is not None else elapsed
+    return best, commits, peak
+
+def measure(data, stage, repeat):
+    """
+    Runs the stage repeat times in a child process, so that its peak
+    memory is not hidden by earlier stages, and returns the best time,
+    the number of commits and the peak memory used
+    """
+    return in_child(_measure, data, stage, repeat)
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("-s", "--scales",
+                  default="1,10,100",
+                  help="the archive sizes to benchmark, as multiples of date.html [default: %default]")
+    parser.add_option("-n", "--repeat",
+                  type="int", default=3,
+                  help="the number of times to run each stage, the best time is kept [default: %default]")
+    parser.add_option("--stages",
+                  default=",".join(Benchmark.STAGES),
+                  help="the stages to benchmark [default: %default]")
+    parser.add_option("-b", "--baseline",
+                  default=BASELINE, metavar="FILE",
+                  help="the baseline to compare against [default: %default]")
+    parser.add_option("--save",
+                  action="store_true",
+                  help="save the results as the new baseline")
+    parser.add_option("-t", "--threshold",
+                  type="float", default=0.25,
+                  help="fail if a stage is this much slower than the baseline [default: %default]")
+    options, args = parser.parse_args()
+
+    #progress messages from the stats go to stderr
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+
+    try:
+        baseline = json.load(open(options.baseline))
+    except IOError:
+        baseline = {}
+
+    error = check_parsers(open(ARCHIVE).read(), 1489)
+    if error:
+        stdout.write("%s\n" % error)
+        return 1
+
+    error = check_http_cache(open(ARCHIVE).read())
+    if error:
+        stdout.write("%s\n" % error)
+        return 1
+
+    #the plans are checked with the most commits, sqlite may only choose
+    #to scan a table when it is small
+    scales = [int(s) for s in options.scales.split(",")]
+    error = in_child(check_query_plans, max(scales))
+    if error:
+        stdout.write("%s\n" % error)
+        return 1
+
+    error, times = check_chart_encoding(50000)
+    if error:
+        stdout.write("%s\n" % error)
+        return 1
+    stdout.write("chart encoding of 50000 values: %s\n" % ", ".join(
+                "%s %.1fms" % (name, t * 1000) for name, t in sorted(times.items())))
+
+    results = {}
+    regressions = []
+    stdout.write("%-12s %5s %8s %10s %12s %10s %10s %10s\n" % (
+                "stage", "scale", "commits", "time (ms)", "commits/s", "MB/s", "peak (MB)", "baseline"))
+    for scale in scales:
+        data = make_archive(scale)
+        for stage in options.stages.split(","):
+            key = "%s-%d" % (stage, scale)
+            try:
+                elapsed, commits, peak = measure(data, stage, options.repeat)
+            except ImportError, e:
+                #the tree needs gtk
+                stdout.write("%-12s %5d skipped, %s\n" % (stage, scale, e))
+                continue
+            results[key] = {"time":elapsed, "commits":commits, "peak":peak}
+
+            change = ""
+            if key in baseline:
+                ratio = elapsed / baseline[key]["time"]
+                change = "%+.0f%%" % ((ratio - 1) * 100)
+                if ratio > 1 + options.threshold and elapsed - baseline[key]["time"] > NOISE:
+                    regressions.append(key)
+                    change += " SLOWER"
+            stdout.write("%-12s %5d %8d %10.1f %12.0f %10.2f %10.1f %10s\n" % (
+                        stage, scale, commits, elapsed * 1000,
+                        commits / elapsed if elapsed else 0,
+                        len(data) / elapsed / 1e6 if elapsed else 0,
+                        peak / 1e6,
+                        change))
+
+    if options.save:
+        json.dump(results, open(options.baseline, "w"), indent=2, sort_keys=True)
+        stdout.write("saved baseline %s\n" % options.baseline)
+
+    if regressions:
+        stdout.write("regressed by more than %d%%: %s\n" % (options.threshold * 100, ", ".join(regressions)))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())